@@ -6,18 +6,30 @@ Supports real DeFi yield tracking from Aave V3.
 """
 
 import asyncio
+import hashlib
 import logging
+import math
+import os
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Optional
 from dataclasses import dataclass, field
 from enum import Enum
 
+import orjson
 import yaml
 import aiohttp
 import aiosqlite
 from rich.console import Console
 
+try:
+    # libyaml C parser; roughly 10x the pure-Python loader
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,6 +46,7 @@ console = Console()
 BASE_CHAIN_CONFIG = {
     "chain_id": 8453,
     "rpc_url": "https://mainnet.base.org",
+    "ws_url": "",  # set rpc_ws_url in config.yaml (needs a WS-capable provider)
     "explorer_api": "https://api.basescan.org/api",
     "explorer_url": "https://basescan.org",
     
@@ -67,6 +80,92 @@ class SpendingMode(Enum):
     GROWTH = 0.3
 
 
+# Constant Decimals are built once here; constructing them from strings on
+# every call in the polling loop is pure overhead
+_BALANCE_OF_SELECTOR = "0x70a08231"
+_GET_RESERVE_DATA_SELECTOR = "0x35ea6a75"  # Pool.getReserveData(address)
+
+# keccak("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+# Canonical Multicall3 deployment (same address on Base as on mainnet)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+_AGGREGATE3_SELECTOR = "0x82ad56cb"  # aggregate3((address,bool,bytes)[])
+
+
+def _encode_aggregate3(calls: list) -> str:
+    """ABI-encode Multicall3.aggregate3 calldata for (target, calldata) pairs.
+
+    Every call is marked allowFailure so one reverting token read cannot
+    take down the whole aggregate.
+    """
+    n = len(calls)
+    offsets = []
+    tails = []
+    running = 32 * n
+    for target, data_hex in calls:
+        data = bytes.fromhex(data_hex[2:] if data_hex.startswith("0x") else data_hex)
+        padded_hex = data.hex().ljust(((len(data) + 31) // 32 * 32) * 2, '0')
+        tuple_enc = (
+            f"{int(target, 16):064x}"    # target address
+            f"{1:064x}"                  # allowFailure = true
+            f"{0x60:064x}"               # offset of callData within tuple
+            f"{len(data):064x}"          # callData length
+            f"{padded_hex}"
+        )
+        offsets.append(f"{running:064x}")
+        tails.append(tuple_enc)
+        running += len(tuple_enc) // 2
+    return _AGGREGATE3_SELECTOR + f"{0x20:064x}" + f"{n:064x}" + "".join(offsets) + "".join(tails)
+
+
+def _decode_aggregate3(result_hex: str) -> list:
+    """Decode aggregate3 returndata into a list of (success, returndata bytes)"""
+    raw = bytes.fromhex(result_hex[2:] if result_hex.startswith("0x") else result_hex)
+    base = int.from_bytes(raw[0:32], 'big')
+    n = int.from_bytes(raw[base:base + 32], 'big')
+    arr = base + 32
+
+    items = []
+    for i in range(n):
+        off = int.from_bytes(raw[arr + 32 * i:arr + 32 * i + 32], 'big')
+        tup = arr + off
+        success = int.from_bytes(raw[tup:tup + 32], 'big') == 1
+        data_off = int.from_bytes(raw[tup + 32:tup + 64], 'big')
+        dstart = tup + data_off
+        dlen = int.from_bytes(raw[dstart:dstart + 32], 'big')
+        items.append((success, raw[dstart + 32:dstart + 32 + dlen]))
+    return items
+_TEN_POW = {6: Decimal(10) ** 6, 18: Decimal(10) ** 18}
+# Multiplying by a cached reciprocal scale is cheaper than dividing by 10**N
+_SCALE = {6: Decimal("0.000001"), 18: Decimal("1e-18")}
+
+# Internal amounts are fixed-point micro-USD integers (1 USD = 10**6),
+# mirroring how lending protocols accrue on integer indexes. Integer
+# multiplies are an order of magnitude cheaper than Decimal arithmetic
+# in CPython, and Decimal only appears at the display/JSON boundary.
+_MICRO = 10 ** 6
+_MICRO_DEC = _TEN_POW[6]
+_MODE_BPS = {m: int(m.value * 10000) for m in SpendingMode}
+
+# Parameterized SQL is kept at module level so SQLite parses it once per
+# connection statement-cache entry, not once per call site
+_SQL_INSERT_TX = '''
+    INSERT OR REPLACE INTO transactions
+    (tx_hash, timestamp, amount_usd, token, direction, merchant, category, status, within_budget)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+_SQL_INSERT_SNAPSHOT = '''
+    INSERT INTO state_snapshots
+    (timestamp, principal_usd, accrued_yield_usd, spent_from_yield_usd, spending_mode)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# How often buffered snapshots are flushed to SQLite (seconds)
+_SNAPSHOT_FLUSH_INTERVAL = 600
+
+
 @dataclass
 class YieldSource:
     name: str
@@ -75,14 +174,27 @@ class YieldSource:
     apy_percent: Decimal
     last_updated: datetime = field(default_factory=datetime.now)
     protocol_address: Optional[str] = None
-    
+
+    def __post_init__(self):
+        # Principal/APY only change when the source object is replaced on
+        # refresh, so the derived rates are computed once here rather than
+        # on every property access in the reporting path
+        self.principal_micro = int(self.principal_usd * _MICRO)
+        self.apy_bps = int(self.apy_percent * 100)
+        self._hourly_micro = self.principal_micro * self.apy_bps // (10000 * 365 * 24)
+        self._daily_micro = self.principal_micro * self.apy_bps // (10000 * 365)
+
+    @property
+    def hourly_micro(self) -> int:
+        return self._hourly_micro
+
     @property
     def daily_yield(self) -> Decimal:
-        return (self.principal_usd * (self.apy_percent / 100)) / 365
-    
+        return Decimal(self._daily_micro) / _MICRO_DEC
+
     @property
     def hourly_yield(self) -> Decimal:
-        return self.daily_yield / 24
+        return Decimal(self._hourly_micro) / _MICRO_DEC
 
 
 @dataclass 
@@ -99,94 +211,222 @@ class Transaction:
 
 @dataclass
 class AgentState:
-    principal_usd: Decimal
-    accrued_yield_usd: Decimal
-    spent_from_yield_usd: Decimal
+    principal_micro: int
+    accrued_yield_micro: int
+    spent_from_yield_micro: int
     spending_mode: SpendingMode
     yield_sources: list
     last_yield_update: datetime
     transactions: list = field(default_factory=list)
-    
+
+    def __post_init__(self):
+        # Monotonic counter bumped on every mutation; cheap cache key for
+        # anything rendered from this state
+        self._state_version = 0
+        # Accrual is driven off the monotonic clock: no datetime allocation
+        # per tick and no sensitivity to wall-clock jumps
+        self._last_accrual_mono = time.monotonic()
+        self._refresh_yield_cache()
+
+    def _refresh_yield_cache(self):
+        """Recompute the summed hourly rate; call after yield_sources changes.
+
+        Keeping the total cached turns every accrual tick and status read
+        into an O(1) attribute read instead of an O(N) sum over sources.
+        """
+        self._hourly_total_micro = sum(s.hourly_micro for s in self.yield_sources)
+        self._state_version += 1
+
+    @property
+    def principal_usd(self) -> Decimal:
+        return Decimal(self.principal_micro) / _MICRO_DEC
+
+    @property
+    def accrued_yield_usd(self) -> Decimal:
+        return Decimal(self.accrued_yield_micro) / _MICRO_DEC
+
+    @property
+    def spent_from_yield_usd(self) -> Decimal:
+        return Decimal(self.spent_from_yield_micro) / _MICRO_DEC
+
+    @property
+    def _budget_micro(self) -> int:
+        net_micro = self.accrued_yield_micro - self.spent_from_yield_micro
+        return net_micro * _MODE_BPS[self.spending_mode] // 10000
+
     @property
     def available_budget(self) -> Decimal:
-        net_yield = self.accrued_yield_usd - self.spent_from_yield_usd
-        return net_yield * Decimal(str(self.spending_mode.value))
-    
+        return Decimal(self._budget_micro) / _MICRO_DEC
+
     @property
     def total_daily_yield(self) -> Decimal:
-        return sum(s.daily_yield for s in self.yield_sources)
-    
-    def add_yield(self, hours: float = 1) -> Decimal:
-        total_hourly = sum(s.hourly_yield for s in self.yield_sources)
-        accrued = total_hourly * Decimal(str(hours))
-        self.accrued_yield_usd += accrued
-        self.last_yield_update = datetime.now()
-        return accrued
-    
+        return Decimal(self._hourly_total_micro * 24) / _MICRO_DEC
+
+    def add_yield(self) -> Decimal:
+        now = time.monotonic()
+        hours = (now - self._last_accrual_mono) / 3600.0
+        accrued_micro = int(self._hourly_total_micro * hours)
+        if accrued_micro:
+            # Only advance the clock when something accrued, so truncated
+            # sub-micro amounts roll into the next tick instead of vanishing
+            self.accrued_yield_micro += accrued_micro
+            self._last_accrual_mono = now
+            self._state_version += 1
+            self.last_yield_update = datetime.now()
+        return Decimal(accrued_micro) / _MICRO_DEC
+
     def record_spending(self, amount_usd: Decimal) -> tuple:
-        net_yield = self.accrued_yield_usd - self.spent_from_yield_usd
-        budget = net_yield * Decimal(str(self.spending_mode.value))
-        
-        if amount_usd <= budget:
-            self.spent_from_yield_usd += amount_usd
-            return True, f"✅ Spent ${amount_usd:.2f} from yield (${budget - amount_usd:.2f} remaining)"
+        amount_micro = int(amount_usd * _MICRO)
+        budget_micro = self._budget_micro
+        self.spent_from_yield_micro += amount_micro
+        self._state_version += 1
+
+        if amount_micro <= budget_micro:
+            remaining = Decimal(budget_micro - amount_micro) / _MICRO_DEC
+            return True, f"✅ Spent ${amount_usd:.2f} from yield (${remaining:.2f} remaining)"
         else:
-            self.spent_from_yield_usd += amount_usd
-            overage = amount_usd - budget
+            overage = Decimal(amount_micro - budget_micro) / _MICRO_DEC
             return False, f"⚠️ Over budget by ${overage:.2f}! This dips into principal."
 
+    def reverse_spending(self, amount_usd: Decimal):
+        """Back out a spend that was recorded optimistically (e.g. for a
+        transfer whose transaction later failed)"""
+        self.spent_from_yield_micro -= int(amount_usd * _MICRO)
+        self._state_version += 1
+
+
+class _BloomFilter:
+    """Fixed-memory membership filter over raw 32-byte tx hashes.
+
+    An unbounded set of 66-char hex strings grows to MB-scale for active
+    wallets; this stays at ~1.8 bits per entry per hash function with a
+    tunable false-positive rate. Positives must be confirmed against the
+    transactions table since they can be false; negatives are exact.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        num_bits = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self._num_bits = max(num_bits, 8)
+        self._num_hashes = max(1, round(self._num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self._num_bits + 7) // 8)
+
+    def _indexes(self, item: bytes):
+        # Double hashing from a single blake2b digest
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self._num_hashes):
+            yield (h1 + i * h2) % self._num_bits
+
+    def add(self, item: bytes):
+        for idx in self._indexes(item):
+            self._bits[idx >> 3] |= 1 << (idx & 7)
+
+    def __contains__(self, item: bytes) -> bool:
+        return all(self._bits[idx >> 3] & (1 << (idx & 7)) for idx in self._indexes(item))
+
 
 class BaseChainMonitor:
     """Monitors wallet activity on Base chain via RPC"""
     
-    def __init__(self, wallet_address: str, api_key: str = ""):
+    def __init__(self, wallet_address: str, session: Optional[aiohttp.ClientSession], api_key: str = ""):
         self.wallet_address = wallet_address.lower()
         self.rpc_url = BASE_CHAIN_CONFIG["rpc_url"]
         self.api_key = api_key
-        self._session: Optional[aiohttp.ClientSession] = None
-        self.seen_tx_hashes: set = set()
-    
-    async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
-        return self._session
-    
-    async def close(self):
-        if self._session and not self._session.closed:
-            await self._session.close()
-    
+        self._session = session
+        self.seen_tx_hashes = _BloomFilter()
+        # balanceOf(wallet) calldata never changes; build it once
+        self._balance_call_data = _BALANCE_OF_SELECTOR + self.wallet_address[2:].zfill(64)
+        # Transfer log filter for this wallet is fixed; freeze the padded
+        # topic and filter template once instead of per subscription/poll
+        self._topic_wallet = "0x" + self.wallet_address[2:].zfill(64)
+        self._log_filter = {
+            "address": [info["address"] for info in BASE_CHAIN_CONFIG["tokens"].values()],
+            "topics": [TRANSFER_TOPIC, self._topic_wallet],
+        }
+        # All token reads are folded into one Multicall3 aggregate, and the
+        # aggregate is fully constant per wallet, so the serialized request
+        # bytes are built once and POSTed as-is each poll
+        self._balance_tokens = list(BASE_CHAIN_CONFIG["tokens"].items())
+        agg_data = _encode_aggregate3([
+            (info["address"], self._balance_call_data) for _, info in self._balance_tokens
+        ])
+        self._balances_payload = orjson.dumps([
+            {"jsonrpc": "2.0", "method": "eth_call",
+             "params": [{"to": MULTICALL3_ADDRESS, "data": agg_data}, "latest"],
+             "id": 0}
+        ])
+
     async def _call_rpc(self, method: str, params: list) -> dict:
-        session = await self._get_session()
-        payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
+        payload = orjson.dumps({"jsonrpc": "2.0", "method": method, "params": params, "id": 1})
         try:
-            async with session.post(self.rpc_url, json=payload) as response:
-                return await response.json()
+            async with self._session.post(self.rpc_url, data=payload) as response:
+                return orjson.loads(await response.read())
         except Exception as e:
             logger.error(f"RPC call failed: {e}")
             return {}
-    
-    async def get_token_balance(self, token_address: str, decimals: int = 18) -> Decimal:
-        """Get ERC20 token balance via RPC"""
-        padded_address = self.wallet_address[2:].zfill(64)
-        call_data = f"0x70a08231{padded_address}"
-        
-        result = await self._call_rpc("eth_call", [
-            {"to": token_address, "data": call_data},
-            "latest"
+
+    async def _post_batch_raw(self, payload: bytes, count: int) -> list:
+        """POST pre-serialized batch bytes, returning responses ordered by id"""
+        try:
+            async with self._session.post(self.rpc_url, data=payload) as response:
+                results = orjson.loads(await response.read())
+        except Exception as e:
+            logger.error(f"Batch RPC call failed: {e}")
+            return [{} for _ in range(count)]
+
+        by_id = {r.get("id"): r for r in results if isinstance(r, dict)}
+        return [by_id.get(i, {}) for i in range(count)]
+
+    async def _call_rpc_batch(self, calls: list) -> list:
+        """Send multiple RPC calls as one JSON-RPC 2.0 batch (single round-trip).
+
+        Takes a list of (method, params) tuples and returns the response
+        objects in the same order, re-sorted by request id.
+        """
+        payload = orjson.dumps([
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": i}
+            for i, (method, params) in enumerate(calls)
         ])
-        
+        return await self._post_batch_raw(payload, len(calls))
+
+    @staticmethod
+    def _decode_balance(result: dict, decimals: int) -> Decimal:
+        """Decode an eth_call balanceOf response into a token amount"""
         if "result" in result and result["result"] != "0x":
             try:
-                balance_raw = int(result["result"], 16)
-                return Decimal(balance_raw) / Decimal(10**decimals)
+                # fixed-width word: from_bytes beats the base-16 string parser
+                balance_raw = int.from_bytes(bytes.fromhex(result["result"][2:]), "big")
+                scale = _SCALE.get(decimals) or Decimal(10) ** -decimals
+                return Decimal(balance_raw) * scale
             except (ValueError, TypeError):
                 pass
         return Decimal(0)
-    
+
+    async def get_token_balance(self, token_address: str, decimals: int = 18) -> Decimal:
+        """Get ERC20 token balance via RPC"""
+        result = await self._call_rpc("eth_call", [
+            {"to": token_address, "data": self._balance_call_data},
+            "latest"
+        ])
+        return self._decode_balance(result, decimals)
+
     async def get_stablecoin_balances(self) -> dict:
+        """Fetch all stablecoin balances with one Multicall3 eth_call"""
+        result, = await self._post_batch_raw(self._balances_payload, 1)
+        if "result" not in result or result["result"] == "0x":
+            return {}
+
         balances = {}
-        for symbol, info in BASE_CHAIN_CONFIG["tokens"].items():
-            balance = await self.get_token_balance(info["address"], info["decimals"])
+        try:
+            returns = _decode_aggregate3(result["result"])
+        except (ValueError, IndexError):
+            return {}
+        for (symbol, info), (success, data) in zip(self._balance_tokens, returns):
+            if not success or not data:
+                continue
+            scale = _SCALE.get(info["decimals"]) or Decimal(10) ** -info["decimals"]
+            balance = Decimal(int.from_bytes(data[-32:], 'big')) * scale
             if balance > 0:
                 balances[symbol] = balance
         return balances
@@ -195,65 +435,268 @@ class BaseChainMonitor:
         balances = await self.get_stablecoin_balances()
         return sum(balances.values()) if balances else Decimal(0)
     
+    @staticmethod
+    def _tx_hash_bytes(tx_hash: str) -> bytes:
+        return bytes.fromhex(tx_hash[2:] if tx_hash.startswith("0x") else tx_hash)
+
+    def maybe_seen_tx(self, tx_hash: str) -> bool:
+        """True if the hash may have been seen (false positives possible)"""
+        return self._tx_hash_bytes(tx_hash) in self.seen_tx_hashes
+
+    def mark_tx_seen(self, tx_hash: str):
+        self.seen_tx_hashes.add(self._tx_hash_bytes(tx_hash))
+
     async def get_new_outgoing_transfers(self) -> list:
         # Simplified - in production, use event logs or indexer
         return []
 
+    async def watch_wallet_activity(self, ws_url: str, on_transfer, on_block):
+        """Subscribe to wallet Transfer logs and newHeads over WebSocket.
+
+        Replaces fixed-interval polling with push notifications: zero idle
+        traffic and reaction latency bounded by block time rather than the
+        poll interval. Runs until the connection drops, then raises so the
+        caller can reconnect or fall back to polling.
+        """
+        async with self._session.ws_connect(ws_url, heartbeat=30) as ws:
+            await ws.send_bytes(orjson.dumps({
+                "jsonrpc": "2.0", "id": 1, "method": "eth_subscribe",
+                "params": ["logs", self._log_filter]
+            }))
+            await ws.send_bytes(orjson.dumps({
+                "jsonrpc": "2.0", "id": 2, "method": "eth_subscribe",
+                "params": ["newHeads"]
+            }))
+
+            sub_logs = sub_heads = None
+            async for msg in ws:
+                if msg.type not in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                    break
+                data = orjson.loads(msg.data)
+
+                if data.get("id") == 1:
+                    sub_logs = data.get("result")
+                elif data.get("id") == 2:
+                    sub_heads = data.get("result")
+                elif data.get("method") == "eth_subscription":
+                    params = data.get("params", {})
+                    sub = params.get("subscription")
+                    if sub == sub_logs:
+                        await on_transfer(params.get("result", {}))
+                    elif sub == sub_heads:
+                        await on_block(params.get("result", {}))
+
+        raise ConnectionError("WebSocket subscription closed")
+
+
+AAVE_SUBGRAPH_URL = "https://api.thegraph.com/subgraphs/name/aave/protocol-v3-base"
+
+# 1 ray = 10**27; Aave indexes and rates are ray-scaled
+_RAY = Decimal(10) ** 27
+
+# Live APYs are quantized to basis-point display precision; the raw
+# ray division otherwise carries 28 digits into every rendered line
+_APY_QUANT = Decimal("0.01")
+
+# Underlying assets whose token balances can be read as USD 1:1. Anything
+# else (WETH, cbETH, ...) would need a price feed before counting toward
+# principal, so those reserves are skipped.
+_STABLE_UNDERLYINGS = frozenset(
+    token["address"].lower() for token in BASE_CHAIN_CONFIG["tokens"].values()
+)
+
+
+class AaveSubgraphClient:
+    """Fetches all Aave user reserves in one Graph query.
+
+    One indexed query returns every position (balance + live rate) in a
+    single round-trip, where the RPC path needs one read per reserve.
+    """
+
+    _QUERY = """query($user: String!) {
+      userReserves(where: {user: $user}) {
+        scaledATokenBalance
+        reserve {
+          symbol
+          decimals
+          liquidityIndex
+          liquidityRate
+          underlyingAsset
+        }
+      }
+    }"""
+
+    def __init__(self, wallet_address: str, session: Optional[aiohttp.ClientSession], url: str = AAVE_SUBGRAPH_URL):
+        self.wallet_address = wallet_address.lower()
+        self.url = url
+        self._session = session
+
+    async def get_user_reserves(self) -> list:
+        payload = orjson.dumps({
+            "query": self._QUERY,
+            "variables": {"user": self.wallet_address},
+        })
+        async with self._session.post(self.url, data=payload) as response:
+            data = orjson.loads(await response.read())
+        return (data.get("data") or {}).get("userReserves") or []
+
 
 class DeFiYieldTracker:
     """Tracks yield from DeFi protocols"""
     
-    def __init__(self, wallet_address: str, rpc_url: str = None):
+    def __init__(self, wallet_address: str, session: Optional[aiohttp.ClientSession], rpc_url: str = None):
         self.wallet_address = wallet_address.lower()
         self.rpc_url = rpc_url or BASE_CHAIN_CONFIG["rpc_url"]
-        self._session: Optional[aiohttp.ClientSession] = None
-    
-    async def _get_session(self) -> aiohttp.ClientSession:
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
-        return self._session
-    
-    async def close(self):
-        if self._session and not self._session.closed:
-            await self._session.close()
-    
+        self._session = session
+        self._balance_call_data = _BALANCE_OF_SELECTOR + self.wallet_address[2:].zfill(64)
+        # getReserveData(USDC) calldata is constant too
+        usdc = BASE_CHAIN_CONFIG["tokens"]["USDC"]["address"]
+        self._usdc_reserve_call_data = _GET_RESERVE_DATA_SELECTOR + usdc[2:].lower().zfill(64)
+        self.subgraph = AaveSubgraphClient(self.wallet_address, session)
+
     async def _call_rpc(self, method: str, params: list) -> dict:
-        session = await self._get_session()
-        payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
+        payload = orjson.dumps({"jsonrpc": "2.0", "method": method, "params": params, "id": 1})
         try:
-            async with session.post(self.rpc_url, json=payload) as response:
-                return await response.json()
+            async with self._session.post(self.rpc_url, data=payload) as response:
+                return orjson.loads(await response.read())
         except Exception as e:
             logger.error(f"RPC call failed: {e}")
             return {}
-    
-    async def get_aave_usdc_balance(self) -> tuple:
-        """Get Aave aUSDC balance and estimated APY"""
-        atoken_address = BASE_CHAIN_CONFIG["aave_v3"]["aUSDC"]
-        padded_address = self.wallet_address[2:].zfill(64)
-        data = f"0x70a08231{padded_address}"
-        
-        result = await self._call_rpc("eth_call", [
-            {"to": atoken_address, "data": data},
-            "latest"
+
+    async def _call_rpc_batch(self, calls: list) -> list:
+        """Send multiple RPC calls as one JSON-RPC 2.0 batch (single round-trip)"""
+        payload = orjson.dumps([
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": i}
+            for i, (method, params) in enumerate(calls)
         ])
-        
-        balance = Decimal(0)
+        try:
+            async with self._session.post(self.rpc_url, data=payload) as response:
+                results = orjson.loads(await response.read())
+        except Exception as e:
+            logger.error(f"Batch RPC call failed: {e}")
+            return [{} for _ in calls]
+
+        by_id = {r.get("id"): r for r in results if isinstance(r, dict)}
+        return [by_id.get(i, {}) for i in range(len(calls))]
+
+    def _balance_call(self, token_address: str) -> tuple:
+        """Build an (method, params) eth_call tuple for balanceOf(wallet)"""
+        return ("eth_call", [{"to": token_address, "data": self._balance_call_data}, "latest"])
+
+    @staticmethod
+    def _decode_balance(result: dict, decimals: int) -> Decimal:
         if "result" in result and result["result"] != "0x":
             try:
-                balance_raw = int(result["result"], 16)
-                balance = Decimal(balance_raw) / Decimal(10**6)
+                balance_raw = int.from_bytes(bytes.fromhex(result["result"][2:]), "big")
+                scale = _SCALE.get(decimals) or Decimal(10) ** -decimals
+                return Decimal(balance_raw) * scale
             except (ValueError, TypeError):
                 pass
-        
-        # Estimated APY - in production, fetch from Aave contracts
-        apy = Decimal("4.0")
+        return Decimal(0)
+
+    @staticmethod
+    def _decode_liquidity_rate(data: bytes) -> Decimal:
+        """Extract currentLiquidityRate from getReserveData returndata as APY %.
+
+        The rate is the third word of the ReserveData struct, ray-scaled
+        (1e27) annual rate.
+        """
+        if len(data) < 96:
+            return Decimal(0)
+        rate_ray = int.from_bytes(data[64:96], 'big')
+        return (Decimal(rate_ray) / _RAY * 100).quantize(_APY_QUANT)
+
+    async def get_aave_usdc_balance(self) -> tuple:
+        """Get Aave aUSDC balance and current supply APY in one batch"""
+        atoken_address = BASE_CHAIN_CONFIG["aave_v3"]["aUSDC"]
+        pool_address = BASE_CHAIN_CONFIG["aave_v3"]["pool"]
+        balance_result, reserve_result = await self._call_rpc_batch([
+            self._balance_call(atoken_address),
+            ("eth_call", [{"to": pool_address, "data": self._usdc_reserve_call_data}, "latest"]),
+        ])
+        balance = self._decode_balance(balance_result, 6)
+
+        apy = Decimal("4.0")  # fallback if the reserve read fails
+        if "result" in reserve_result and reserve_result["result"] != "0x":
+            try:
+                decoded = self._decode_liquidity_rate(bytes.fromhex(reserve_result["result"][2:]))
+                if decoded > 0:
+                    apy = decoded
+            except ValueError:
+                pass
         return balance, apy
-    
+
     async def get_all_yield_sources(self) -> list:
+        """Fetch every protocol position, preferring one subgraph query.
+
+        The Graph returns all user reserves (balance plus live rate) in a
+        single round-trip; the RPC aggregate remains as fallback.
+        """
+        try:
+            sources = self._sources_from_reserves(await self.subgraph.get_user_reserves())
+            if sources:
+                return sources
+        except Exception as e:
+            logger.warning(f"Subgraph query failed, falling back to RPC: {e}")
+        return await self._get_sources_via_rpc()
+
+    @staticmethod
+    def _sources_from_reserves(reserves: list) -> list:
         sources = []
-        aave_balance, aave_apy = await self.get_aave_usdc_balance()
-        
+        for entry in reserves:
+            reserve = entry.get("reserve") or {}
+            # Balances come back in token units; only stables are USD as-is
+            if (reserve.get("underlyingAsset") or "").lower() not in _STABLE_UNDERLYINGS:
+                continue
+            try:
+                scaled = Decimal(entry.get("scaledATokenBalance", "0"))
+                index = Decimal(reserve.get("liquidityIndex", "0"))
+                rate = Decimal(reserve.get("liquidityRate", "0"))
+                decimals = int(reserve.get("decimals", 18))
+            except (ValueError, TypeError, ArithmeticError):
+                continue
+
+            balance = scaled * index / _RAY * (_SCALE.get(decimals) or Decimal(10) ** -decimals)
+            if balance <= 0:
+                continue
+            sources.append(YieldSource(
+                name=f"Aave V3 {reserve.get('symbol', '?')}",
+                source_type="aave_v3",
+                principal_usd=balance,
+                apy_percent=(rate / _RAY * 100).quantize(_APY_QUANT),
+                protocol_address=BASE_CHAIN_CONFIG["aave_v3"]["pool"]
+            ))
+        return sources
+
+    async def _get_sources_via_rpc(self) -> list:
+        """RPC fallback: one Multicall3 eth_call for every protocol position"""
+        sources = []
+        atoken_address = BASE_CHAIN_CONFIG["aave_v3"]["aUSDC"]
+        pool_address = BASE_CHAIN_CONFIG["aave_v3"]["pool"]
+
+        # All protocol reads share one aggregate; additional protocols append here
+        agg_data = _encode_aggregate3([
+            (atoken_address, self._balance_call_data),
+            (pool_address, self._usdc_reserve_call_data),
+        ])
+        result = await self._call_rpc("eth_call", [
+            {"to": MULTICALL3_ADDRESS, "data": agg_data}, "latest"
+        ])
+
+        aave_balance = Decimal(0)
+        aave_apy = Decimal("4.0")  # fallback if the reserve read fails
+        if "result" in result and result["result"] != "0x":
+            try:
+                returns = _decode_aggregate3(result["result"])
+                if returns and returns[0][0] and returns[0][1]:
+                    aave_balance = Decimal(int.from_bytes(returns[0][1][-32:], 'big')) * _SCALE[6]
+                if len(returns) > 1 and returns[1][0]:
+                    decoded = self._decode_liquidity_rate(returns[1][1])
+                    if decoded > 0:
+                        aave_apy = decoded
+            except (ValueError, IndexError):
+                pass
+
         if aave_balance > 0:
             sources.append(YieldSource(
                 name="Aave V3 USDC",
@@ -271,21 +714,82 @@ class YieldGuardianAgent:
     def __init__(self, config_path: str = "config.yaml"):
         self.config = self._load_config(config_path)
         self.state = self._init_state()
-        
+        self._session: Optional[aiohttp.ClientSession] = None
+
         # Use safe_address if available, else wallet_address
         wallet = self.config.get('safe_address') or self.config.get('wallet_address')
         self.monitor = BaseChainMonitor(
             wallet_address=wallet,
+            session=None,
             api_key=self.config.get('basescan_api_key', '')
         )
-        self.yield_tracker = DeFiYieldTracker(wallet_address=wallet)
+        self.yield_tracker = DeFiYieldTracker(wallet_address=wallet, session=None)
         self.db_path = self.config.get('database_path', 'data/transactions.db')
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_lock = asyncio.Lock()
+        # Snapshots accumulate here and hit SQLite in one executemany
+        self._snapshot_buffer: deque = deque(maxlen=1024)
+        self._snapshot_flusher_task: Optional[asyncio.Task] = None
+        # Rendered-string cache keyed by (state version, spending mode)
+        self._render_cache: dict = {}
+        # Per-source display lines; rebuilt only when the source list changes
+        self._rendered_sources: Optional[list] = None
+        # Coalescing for DeFi refreshes: bursts of commands join the
+        # in-flight fetch instead of stacking duplicate upstream calls
+        self._defi_update_task: Optional[asyncio.Task] = None
+        self._defi_last_update: float = 0.0
         self._running = False
+
+    async def open(self):
+        """Eagerly create the shared RPC session and hand it to the consumers.
+
+        One pooled session means a single TLS handshake against the RPC
+        host, keep-alive reuse for every call afterwards, and no lazy-init
+        branch on the hot path.
+        """
+        if self._session is not None and not self._session.closed:
+            return
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, limit_per_host=32, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=10),
+            headers={'Content-Type': 'application/json', 'User-Agent': 'yield-guardian/1'}
+        )
+        self.monitor._session = self._session
+        self.yield_tracker._session = self._session
+        self.yield_tracker.subgraph._session = self._session
+
+    async def close(self):
+        if self._snapshot_flusher_task is not None:
+            self._snapshot_flusher_task.cancel()
+            self._snapshot_flusher_task = None
+        if self._db is not None:
+            await self.flush_snapshots()
+            await self._db.close()
+            self._db = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        await self.init_database()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
     
+    # Parsed configs keyed by (path -> mtime, config); repeated loads of an
+    # unchanged file are a stat plus a dict lookup
+    _config_cache: dict = {}
+
     def _load_config(self, config_path: str) -> dict:
         try:
+            mtime = os.path.getmtime(config_path)
+            cached = self._config_cache.get(config_path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
             with open(config_path, 'r') as f:
-                return yaml.safe_load(f)
+                config = yaml.load(f, Loader=_YamlLoader)
+            self._config_cache[config_path] = (mtime, config)
+            return config
         except FileNotFoundError:
             logger.error(f"Config file not found: {config_path}")
             raise
@@ -306,99 +810,167 @@ class YieldGuardianAgent:
             ))
         
         return AgentState(
-            principal_usd=Decimal(str(config.get('principal_usd', 0))),
-            accrued_yield_usd=Decimal(str(config.get('initial_yield', 0))),
-            spent_from_yield_usd=Decimal('0'),
+            principal_micro=int(Decimal(str(config.get('principal_usd', 0))) * _MICRO),
+            accrued_yield_micro=int(Decimal(str(config.get('initial_yield', 0))) * _MICRO),
+            spent_from_yield_micro=0,
             spending_mode=spending_mode,
             yield_sources=yield_sources,
             last_yield_update=datetime.now()
         )
     
     async def init_database(self):
-        import os
+        await self.open()
+
         os.makedirs(os.path.dirname(self.db_path) if os.path.dirname(self.db_path) else '.', exist_ok=True)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS transactions (
-                    tx_hash TEXT PRIMARY KEY,
-                    timestamp DATETIME,
-                    amount_usd REAL,
-                    token TEXT,
-                    direction TEXT,
-                    merchant TEXT,
-                    category TEXT,
-                    status TEXT,
-                    within_budget INTEGER
-                )
-            ''')
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS state_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME,
-                    principal_usd REAL,
-                    accrued_yield_usd REAL,
-                    spent_from_yield_usd REAL,
-                    spending_mode TEXT
-                )
-            ''')
-            await db.commit()
-    
+
+        # One connection for the agent's lifetime: re-opening per write pays
+        # file-open plus journal setup on every insert. WAL with NORMAL
+        # syncing cuts that to one fsync per commit group.
+        self._db = await aiosqlite.connect(self.db_path)
+        await self._db.execute('PRAGMA journal_mode=WAL')
+        await self._db.execute('PRAGMA synchronous=NORMAL')
+
+        await self._db.execute('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                tx_hash TEXT PRIMARY KEY,
+                timestamp DATETIME,
+                amount_usd REAL,
+                token TEXT,
+                direction TEXT,
+                merchant TEXT,
+                category TEXT,
+                status TEXT,
+                within_budget INTEGER
+            )
+        ''')
+        await self._db.execute('''
+            CREATE TABLE IF NOT EXISTS state_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME,
+                principal_usd REAL,
+                accrued_yield_usd REAL,
+                spent_from_yield_usd REAL,
+                spending_mode TEXT
+            )
+        ''')
+        # /history reads the newest rows; without this the ORDER BY ... LIMIT
+        # scans and sorts the whole table
+        await self._db.execute('''
+            CREATE INDEX IF NOT EXISTS ix_tx_ts
+            ON transactions(timestamp DESC)
+        ''')
+        await self._db.commit()
+
+        self._snapshot_flusher_task = asyncio.create_task(self._snapshot_flusher())
+
+    @staticmethod
+    def _tx_row(tx: Transaction, within_budget: bool) -> tuple:
+        return (
+            tx.tx_hash, tx.timestamp.isoformat(), float(tx.amount_usd),
+            tx.token, tx.direction, tx.merchant, tx.category, tx.status,
+            1 if within_budget else 0
+        )
+
     async def save_transaction(self, tx: Transaction, within_budget: bool):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                INSERT OR REPLACE INTO transactions 
-                (tx_hash, timestamp, amount_usd, token, direction, merchant, category, status, within_budget)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                tx.tx_hash, tx.timestamp.isoformat(), float(tx.amount_usd),
-                tx.token, tx.direction, tx.merchant, tx.category, tx.status,
-                1 if within_budget else 0
-            ))
-            await db.commit()
-    
+        async with self._db_lock:
+            await self._db.execute(_SQL_INSERT_TX, self._tx_row(tx, within_budget))
+            await self._db.commit()
+
+    async def save_transactions(self, rows: list):
+        """Insert many transaction rows under a single commit"""
+        if not rows:
+            return
+        async with self._db_lock:
+            await self._db.executemany(_SQL_INSERT_TX, rows)
+            await self._db.commit()
+
     async def save_state_snapshot(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                INSERT INTO state_snapshots 
-                (timestamp, principal_usd, accrued_yield_usd, spent_from_yield_usd, spending_mode)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                datetime.now().isoformat(),
-                float(self.state.principal_usd),
-                float(self.state.accrued_yield_usd),
-                float(self.state.spent_from_yield_usd),
-                self.state.spending_mode.name
-            ))
-            await db.commit()
+        # Buffered: a burst of snapshots becomes one executemany + one
+        # fsync on the flush cadence (and on shutdown)
+        self._snapshot_buffer.append((
+            datetime.now().isoformat(),
+            float(self.state.principal_usd),
+            float(self.state.accrued_yield_usd),
+            float(self.state.spent_from_yield_usd),
+            self.state.spending_mode.name
+        ))
+
+    async def flush_snapshots(self):
+        if not self._snapshot_buffer:
+            return
+        rows = list(self._snapshot_buffer)
+        self._snapshot_buffer.clear()
+        async with self._db_lock:
+            await self._db.executemany(_SQL_INSERT_SNAPSHOT, rows)
+            await self._db.commit()
+
+    async def _snapshot_flusher(self):
+        while True:
+            await asyncio.sleep(_SNAPSHOT_FLUSH_INTERVAL)
+            try:
+                await self.flush_snapshots()
+            except Exception as e:
+                logger.warning(f"Snapshot flush failed: {e}")
     
     async def update_yield(self):
-        hours_since = (datetime.now() - self.state.last_yield_update).total_seconds() / 3600
-        if hours_since >= 0.1:
-            self.state.add_yield(hours_since)
+        self.state.add_yield()
     
     async def update_yield_from_defi(self):
+        """Refresh yield sources from on-chain/subgraph data.
+
+        Calls arriving while a refresh is in flight await that same task,
+        and calls within 10s of a completed refresh return immediately, so
+        a burst of commands costs one round of upstream requests.
+        """
+        if time.monotonic() - self._defi_last_update < 10:
+            return
+        if self._defi_update_task and not self._defi_update_task.done():
+            return await asyncio.shield(self._defi_update_task)
+        self._defi_update_task = asyncio.create_task(self._do_update_from_defi())
+        return await self._defi_update_task
+
+    async def _do_update_from_defi(self):
         try:
             defi_sources = await self.yield_tracker.get_all_yield_sources()
             if defi_sources:
                 simulated = [s for s in self.state.yield_sources if s.source_type == 'simulated']
                 self.state.yield_sources = simulated + defi_sources
+                self.state._refresh_yield_cache()
+                self._rendered_sources = None
                 logger.info(f"Updated {len(defi_sources)} DeFi yield sources")
+            self._defi_last_update = time.monotonic()
         except Exception as e:
             logger.warning(f"Could not update DeFi yields: {e}")
     
+    async def _tx_exists(self, tx_hash: str) -> bool:
+        async with self._db_lock:
+            cursor = await self._db.execute(
+                'SELECT 1 FROM transactions WHERE tx_hash = ?', (tx_hash,)
+            )
+            return await cursor.fetchone() is not None
+
     async def process_new_transactions(self) -> list:
         results = []
+        rows = []
         new_transfers = await self.monitor.get_new_outgoing_transfers()
-        
+
         for tx in new_transfers:
+            if self.monitor.maybe_seen_tx(tx.tx_hash):
+                # Bloom positives can be false; only skip when the durable
+                # store confirms the hash
+                if await self._tx_exists(tx.tx_hash):
+                    continue
+            self.monitor.mark_tx_seen(tx.tx_hash)
+
             if tx.amount_usd > 0:
                 is_within_budget, message = self.state.record_spending(tx.amount_usd)
                 tx.status = 'within_budget' if is_within_budget else 'over_budget'
-                await self.save_transaction(tx, is_within_budget)
+                rows.append(self._tx_row(tx, is_within_budget))
                 results.append((tx, is_within_budget, message))
                 logger.info(f"Transaction {tx.tx_hash[:8]}...: ${tx.amount_usd:.2f} - {message}")
-        
+
+        # A burst of transfers becomes one executemany + one commit
+        await self.save_transactions(rows)
         return results
     
     async def get_status(self) -> dict:
@@ -426,7 +998,30 @@ class YieldGuardianAgent:
             ]
         }
     
+    def _render_cached(self, kind: str, render) -> str:
+        """Return the cached rendering of `kind` unless the state changed"""
+        key = (self.state._state_version, self.state.spending_mode)
+        cached = self._render_cache.get(kind)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        text = render()
+        self._render_cache[kind] = (key, text)
+        return text
+
+    def get_source_lines(self) -> list:
+        """Rendered bullet line per yield source, cached until the source
+        list is swapped by a DeFi refresh"""
+        if self._rendered_sources is None:
+            self._rendered_sources = [
+                f"• {src.name}: ${src.principal_usd:,.0f} @ {src.apy_percent}%"
+                for src in self.state.yield_sources
+            ]
+        return self._rendered_sources
+
     def get_status_summary(self) -> str:
+        return self._render_cached('summary', self._render_status_summary)
+
+    def _render_status_summary(self) -> str:
         s = self.state
         return f"""🛡️ *Yield Guardian Status*
 
@@ -439,6 +1034,9 @@ class YieldGuardianAgent:
 📊 *Daily Yield:* ${s.total_daily_yield:,.2f}/day"""
     
     def get_budget_details(self) -> str:
+        return self._render_cached('budget', self._render_budget_details)
+
+    def _render_budget_details(self) -> str:
         s = self.state
         net_yield = s.accrued_yield_usd - s.spent_from_yield_usd
         
@@ -8,9 +8,9 @@ using self-custody wallets and smart contracts.
 
 import asyncio
 import logging
-from datetime import datetime, timedelta
+import time
 
-from agent import YieldGuardianAgent
+from agent import BASE_CHAIN_CONFIG, YieldGuardianAgent
 from telegram_bot import TelegramBot
 
 logging.basicConfig(
@@ -20,56 +20,112 @@ logging.basicConfig(
 logger = logging.getLogger('yield_guardian')
 
 
+class _UpdateSchedule:
+    """Tracks the hourly DeFi-refresh and snapshot cadences across ticks.
+
+    Uses the monotonic clock: cheaper than allocating datetimes per tick
+    and immune to wall-clock adjustments.
+    """
+
+    def __init__(self):
+        self.last_snapshot = time.monotonic()
+        self.last_defi_update = time.monotonic() - 3600
+
+    def defi_due(self) -> bool:
+        if time.monotonic() - self.last_defi_update > 3600:
+            self.last_defi_update = time.monotonic()
+            return True
+        return False
+
+    def snapshot_due(self) -> bool:
+        if time.monotonic() - self.last_snapshot >= 3600:
+            self.last_snapshot = time.monotonic()
+            return True
+        return False
+
+
+async def run_tick(agent: YieldGuardianAgent, bot: TelegramBot, schedule: _UpdateSchedule):
+    """One round of accrual, transfer processing, and periodic upkeep"""
+    # The per-tick RPCs are independent, so overlap them instead of
+    # paying each round-trip's latency in sequence
+    tick = [agent.update_yield(), agent.process_new_transactions()]
+    if schedule.defi_due():
+        tick.append(agent.update_yield_from_defi())
+
+    _, results, *_ = await asyncio.gather(*tick)
+
+    if schedule.snapshot_due():
+        await agent.save_state_snapshot()
+
+    for tx, is_within_budget, message in results:
+        await bot.send_transaction_alert(tx, is_within_budget, message)
+
+
+async def run_polling_loop(agent: YieldGuardianAgent, bot: TelegramBot):
+    """Fallback: poll on a fixed interval when no WebSocket endpoint is set"""
+    schedule = _UpdateSchedule()
+    poll_interval = agent.config.get('poll_interval', 30)
+    while True:
+        await run_tick(agent, bot, schedule)
+        await asyncio.sleep(poll_interval)
+
+
+async def run_event_loop(agent: YieldGuardianAgent, bot: TelegramBot, ws_url: str):
+    """Event-driven: react to pushed Transfer logs and new block heads.
+
+    No idle RPC traffic between events, and transfer reaction latency is
+    bounded by block time instead of the poll interval.
+    """
+    schedule = _UpdateSchedule()
+
+    async def on_transfer(log: dict):
+        await run_tick(agent, bot, schedule)
+
+    async def on_block(head: dict):
+        # Accrue on block-time progress; run_tick's own cadences gate the rest
+        await agent.update_yield()
+        if schedule.defi_due():
+            await agent.update_yield_from_defi()
+        if schedule.snapshot_due():
+            await agent.save_state_snapshot()
+
+    while True:
+        try:
+            await agent.monitor.watch_wallet_activity(ws_url, on_transfer, on_block)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"WebSocket subscription lost ({e}), reconnecting in 5s")
+            await asyncio.sleep(5)
+
+
 async def main():
-    # Initialize agent
+    # Initialize agent; entering the context opens the shared RPC
+    # session and the database
     agent = YieldGuardianAgent("config.yaml")
     bot = TelegramBot(agent)
-    
-    # Setup database
-    await agent.init_database()
-    
-    # Start Telegram bot
-    await bot.start()
-    
-    logger.info(f"Yield Guardian started")
-    logger.info(f"Monitoring wallet: {agent.config.get('safe_address', agent.config.get('wallet_address', 'N/A'))}")
-    logger.info("Press Ctrl+C to stop")
-    
-    # Tracking for periodic updates
-    last_yield_update = datetime.now()
-    last_defi_update = datetime.now() - timedelta(hours=1)
-    
-    try:
-        while True:
-            # Update DeFi yields every hour
-            if (datetime.now() - last_defi_update).total_seconds() > 3600:
-                await agent.update_yield_from_defi()
-                last_defi_update = datetime.now()
-            
-            # Accrue yield continuously
-            await agent.update_yield()
-            
-            # Save state snapshot every hour
-            hours_since = (datetime.now() - last_yield_update).total_seconds() / 3600
-            if hours_since >= 1:
-                await agent.save_state_snapshot()
-                last_yield_update = datetime.now()
-            
-            # Check for new transactions
-            results = await agent.process_new_transactions()
-            for tx, is_within_budget, message in results:
-                await bot.send_transaction_alert(tx, is_within_budget, message)
-            
-            # Sleep between checks
-            await asyncio.sleep(30)
-    
-    except asyncio.CancelledError:
-        pass
-    finally:
-        await bot.stop()
-        await agent.monitor.close()
-        await agent.yield_tracker.close()
-        logger.info("Yield Guardian stopped")
+
+    async with agent:
+        # Start Telegram bot
+        await bot.start()
+
+        logger.info(f"Yield Guardian started")
+        logger.info(f"Monitoring wallet: {agent.config.get('safe_address', agent.config.get('wallet_address', 'N/A'))}")
+        logger.info("Press Ctrl+C to stop")
+
+        ws_url = agent.config.get('rpc_ws_url') or BASE_CHAIN_CONFIG.get('ws_url')
+
+        try:
+            if ws_url:
+                logger.info(f"Using WebSocket subscriptions via {ws_url}")
+                await run_event_loop(agent, bot, ws_url)
+            else:
+                await run_polling_loop(agent, bot)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await bot.stop()
+            logger.info("Yield Guardian stopped")
 
 
 if __name__ == "__main__":
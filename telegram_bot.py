@@ -5,6 +5,8 @@ Yield Guardian Agent - Telegram Bot Interface
 import asyncio
 import logging
 from datetime import datetime
+
+import aiosqlite
 from decimal import Decimal
 from typing import Optional
 
@@ -14,12 +16,92 @@ from telegram.ext import (
     ContextTypes
 )
 from telegram.constants import ParseMode
+from telegram.request import HTTPXRequest
 
 from agent import YieldGuardianAgent, Transaction, SpendingMode
 from transfer_executor import TransferExecutor
 
 logger = logging.getLogger('yield_guardian.telegram')
 
+# Static replies built once at import instead of per command
+_WELCOME = """🛡️ *Yield Guardian Active!*
+
+I'm protecting your principal and managing your spending budget.
+
+*💰 Spending:*
+/spend <amount> - Check if amount is within budget
+/topup - See available yield for card
+/transfer <amount> - Send yield to Wirex card
+
+*📊 Status:*
+/status - Overview of balances & budget
+/budget - Detailed budget breakdown
+/yield - Yield accrual details
+
+*⚙️ Settings:*
+/mode - Change spending mode
+/agent - Agent wallet status
+/help - All commands
+
+_Your principal is always protected._"""
+
+_HELP = """🛡️ *Yield Guardian Commands*
+
+*💰 Spending:*
+/spend <amount> - Check if amount is within budget
+/topup - See available yield for card
+/transfer <amount> - Send yield to Wirex card
+
+*📊 Status:*
+/status - Overview of balances & budget
+/budget - Detailed budget breakdown
+/yield - Yield accrual details
+/history - Recent transactions
+
+*⚙️ Settings:*
+/mode - Change spending mode
+/agent - Agent wallet status
+/help - This message
+
+*Spending Modes:*
+🐢 Conservative - Spend 50% of yield
+⚖️ Balanced - Spend 80% of yield
+🚀 Growth - Spend 30% of yield"""
+
+_TX_SUCCESS_TMPL = """✅ *Transfer Complete!*
+
+Sent: ${amount:.2f} USDC
+To: Wirex Pay Card
+
+🔗 [View on Basescan]({url})
+
+Your card is ready to use! 💳"""
+
+_TX_FAILED_TMPL = """❌ *Transfer Failed*
+
+Error: {error}
+
+Please try again or check agent wallet status with /agent"""
+
+_NEEDS_FUNDING_TMPL = """⚠️ *Agent wallet needs funding*
+
+Requested: ${amount:.2f}
+Agent wallet has: ${balance:.2f} USDC
+
+Please transfer USDC from your Safe to:
+`{address}`"""
+
+# Divider between coalesced alerts, and the largest joined text we send
+# in one message (headroom under Telegram's 4096-character limit)
+_ALERT_SEP = "\n\n───\n\n"
+_ALERT_MAX_LEN = 4000
+
+_MODE_MAP = {
+    'conservative': SpendingMode.CONSERVATIVE,
+    'balanced': SpendingMode.BALANCED,
+    'growth': SpendingMode.GROWTH
+}
+
 
 class TelegramBot:
     def __init__(self, agent: YieldGuardianAgent):
@@ -30,11 +112,31 @@ class TelegramBot:
         self.authorized_user_id = tg_config.get('authorized_user_id') or self.config.get('telegram_user_id', 0)
         self.app: Optional[Application] = None
         self._executor: Optional[TransferExecutor] = None
+        # Long-lived read connection for /history; opening a fresh SQLite
+        # connection per command costs more than the query itself
+        self._db: Optional[aiosqlite.Connection] = None
+        # One-permit semaphore per chat: keeps transfers in a chat ordered
+        # while updates from other chats proceed concurrently
+        self._chat_sems: dict = {}
+        # Alerts queue up here and a background task coalesces bursts
+        # into single messages (see _alert_flusher)
+        self._alert_queue: asyncio.Queue = asyncio.Queue()
+        self._alert_flusher_task: Optional[asyncio.Task] = None
+        # Strong refs to fire-and-forget tasks (the loop only keeps weak
+        # ones, so an unreferenced watcher could be collected mid-wait)
+        self._pending_tasks: set = set()
     
     def _get_executor(self) -> TransferExecutor:
         if self._executor is None:
             self._executor = TransferExecutor(self.config)
         return self._executor
+
+    async def _get_db(self) -> aiosqlite.Connection:
+        if self._db is None:
+            self._db = await aiosqlite.connect(self.agent.db_path)
+            await self._db.execute("PRAGMA journal_mode=WAL")
+            await self._db.execute("PRAGMA synchronous=NORMAL")
+        return self._db
     
     def _is_authorized(self, user_id: int) -> bool:
         return user_id == self.authorized_user_id
@@ -53,28 +155,7 @@ class TelegramBot:
         if not await self._check_auth(update):
             return
         
-        welcome = """🛡️ *Yield Guardian Active!*
-
-I'm protecting your principal and managing your spending budget.
-
-*💰 Spending:*
-/spend <amount> - Check if amount is within budget
-/topup - See available yield for card
-/transfer <amount> - Send yield to Wirex card
-
-*📊 Status:*
-/status - Overview of balances & budget
-/budget - Detailed budget breakdown
-/yield - Yield accrual details
-
-*⚙️ Settings:*
-/mode - Change spending mode
-/agent - Agent wallet status
-/help - All commands
-
-_Your principal is always protected._"""
-        
-        await update.message.reply_text(welcome, parse_mode=ParseMode.MARKDOWN)
+        await update.message.reply_text(_WELCOME, parse_mode=ParseMode.MARKDOWN)
     
     async def cmd_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not await self._check_auth(update):
@@ -107,24 +188,24 @@ _Your principal is always protected._"""
             "", "*Sources:*"
         ]
         
-        for src in s.yield_sources:
-            lines.append(f"• {src.name}: ${src.principal_usd:,.0f} @ {src.apy_percent}%")
-        
+        lines.extend(self.agent.get_source_lines())
+
         await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
     
     async def cmd_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not await self._check_auth(update):
             return
         
-        import aiosqlite
         try:
-            async with aiosqlite.connect(self.agent.db_path) as db:
-                cursor = await db.execute('''
-                    SELECT timestamp, amount_usd, token, direction, status, within_budget
-                    FROM transactions ORDER BY timestamp DESC LIMIT 10
-                ''')
-                rows = await cursor.fetchall()
-        except:
+            db = await self._get_db()
+            rows = await db.execute_fetchall('''
+                SELECT timestamp, amount_usd, token, direction, status, within_budget
+                FROM transactions ORDER BY timestamp DESC LIMIT 10
+            ''')
+        except aiosqlite.Error as e:
+            # Bare except here used to swallow CancelledError too, keeping
+            # the handler alive through shutdown
+            logger.warning(f"History query failed: {e}")
             rows = []
         
         if not rows:
@@ -164,8 +245,12 @@ _Your principal is always protected._"""
             return
         
         await self.agent.update_yield()
-        available = float(self.agent.state.available_budget)
-        
+        # One Decimal->float conversion per value; both branches format
+        # from the same locals
+        state = self.agent.state
+        available = float(state.available_budget)
+        daily_yield = float(state.total_daily_yield)
+
         if amount <= available:
             remaining = available - amount
             await update.message.reply_text(
@@ -176,7 +261,6 @@ _Your principal is always protected._"""
                 parse_mode=ParseMode.MARKDOWN)
         else:
             shortfall = amount - available
-            daily_yield = float(self.agent.state.total_daily_yield)
             days_needed = shortfall / daily_yield if daily_yield > 0 else 999
             
             await update.message.reply_text(
@@ -195,11 +279,13 @@ _Your principal is always protected._"""
         await self.agent.update_yield()
         s = self.agent.state
         available = float(s.available_budget)
-        
+        accrued = float(s.accrued_yield_usd)
+        spent = float(s.spent_from_yield_usd)
+
         await update.message.reply_text(
             f"💳 *Card Top-up Available*\n\n"
-            f"Yield earned: ${float(s.accrued_yield_usd):.2f}\n"
-            f"Already spent: ${float(s.spent_from_yield_usd):.2f}\n"
+            f"Yield earned: ${accrued:.2f}\n"
+            f"Already spent: ${spent:.2f}\n"
             f"Mode reserve: {int((1 - s.spending_mode.value) * 100)}%\n\n"
             f"✅ *Available to transfer: ${available:.2f}*\n\n"
             f"Use `/transfer {available:.2f}` to move to Wirex card",
@@ -224,27 +310,36 @@ _Your principal is always protected._"""
                 parse_mode=ParseMode.MARKDOWN)
             return
         
+        # Serialize transfers within this chat: every check has to run
+        # inside the critical section, or two rapid /transfer commands
+        # could both pass against the same undecremented budget before
+        # either records its spend
+        chat_id = update.effective_chat.id
+        sem = self._chat_sems.setdefault(chat_id, asyncio.Semaphore(1))
+        async with sem:
+            await self._do_transfer(update, amount)
+
+    async def _do_transfer(self, update: Update, amount: float):
         await self.agent.update_yield()
         available = float(self.agent.state.available_budget)
-        
+
         if amount > available:
             await update.message.reply_text(
                 f"❌ Cannot transfer ${amount:.2f}\n"
                 f"Maximum available from yield: ${available:.2f}",
                 parse_mode=ParseMode.MARKDOWN)
             return
-        
+
         # Check executor status
         executor = self._get_executor()
-        status = executor.get_status()
-        
+        status = await executor.get_status_cached()
+
         if status['usdc_balance'] < amount:
             await update.message.reply_text(
-                f"⚠️ *Agent wallet needs funding*\n\n"
-                f"Requested: ${amount:.2f}\n"
-                f"Agent wallet has: ${status['usdc_balance']:.2f} USDC\n\n"
-                f"Please transfer USDC from your Safe to:\n"
-                f"`{status['agent_address']}`",
+                _NEEDS_FUNDING_TMPL.format(
+                    amount=amount,
+                    balance=status['usdc_balance'],
+                    address=status['agent_address']),
                 parse_mode=ParseMode.MARKDOWN)
             return
         
@@ -256,32 +351,60 @@ _Your principal is always protected._"""
                 parse_mode=ParseMode.MARKDOWN)
             return
         
-        # Execute the transfer
-        await update.message.reply_text(
-            f"⏳ *Executing transfer...*\n\n"
-            f"Sending ${amount:.2f} USDC to Wirex Pay...",
+        # Submit the transfer; balances were just checked above from the
+        # cached status
+        submitted = await executor.submit_transfer(amount, prechecked=True)
+
+        if not submitted['success']:
+            await update.message.reply_text(
+                _TX_FAILED_TMPL.format(error=submitted['error']),
+                parse_mode=ParseMode.MARKDOWN)
+            return
+
+        # Deduct the budget at submission, while the semaphore is still
+        # held, so a /transfer arriving during the confirmation window is
+        # checked against the decremented budget. _finalize_transfer backs
+        # it out if the tx fails on-chain.
+        self.agent.state.record_spending(Decimal(str(amount)))
+
+        # Reply as soon as the tx is broadcast; confirmation takes many
+        # seconds, so watch for it in the background and edit this message
+        pending_msg = await update.message.reply_text(
+            f"⏳ *Transfer submitted*\n\n"
+            f"Sending ${amount:.2f} USDC to Wirex Pay...\n"
+            f"Waiting for on-chain confirmation...",
             parse_mode=ParseMode.MARKDOWN)
-        
-        result = await executor.transfer_to_wirex(amount)
-        
+
+        task = asyncio.create_task(self._finalize_transfer(
+            pending_msg, submitted['tx_hash'], amount, executor))
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._on_background_task_done)
+
+    def _on_background_task_done(self, task: asyncio.Task):
+        self._pending_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Background task failed: {task.exception()}")
+
+    async def _finalize_transfer(self, pending_msg, tx_hash: str, amount: float,
+                                 executor: TransferExecutor):
+        """Background task: wait out confirmation, then persist or reverse
+        the recorded spend and update the pending message"""
+        result = await executor.await_receipt(tx_hash)
+
         if result['success']:
-            # Record spending
-            self.agent.state.record_spending(Decimal(str(amount)))
+            # Spend was already recorded at submission; just persist it
             await self.agent.save_state_snapshot()
-            
-            await update.message.reply_text(
-                f"✅ *Transfer Complete!*\n\n"
-                f"Sent: ${amount:.2f} USDC\n"
-                f"To: Wirex Pay Card\n\n"
-                f"🔗 [View on Basescan]({result['explorer_url']})\n\n"
-                f"Your card is ready to use! 💳",
+
+            await pending_msg.edit_text(
+                _TX_SUCCESS_TMPL.format(amount=amount, url=result['explorer_url']),
                 parse_mode=ParseMode.MARKDOWN,
                 disable_web_page_preview=True)
         else:
-            await update.message.reply_text(
-                f"❌ *Transfer Failed*\n\n"
-                f"Error: {result['error']}\n\n"
-                f"Please try again or check agent wallet status with /agent",
+            # The optimistic deduction was for a transfer that never
+            # happened; give the budget back
+            self.agent.state.reverse_spending(Decimal(str(amount)))
+            await pending_msg.edit_text(
+                _TX_FAILED_TMPL.format(error=result['error']),
                 parse_mode=ParseMode.MARKDOWN)
     
     async def cmd_agent(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -290,8 +413,8 @@ _Your principal is always protected._"""
             return
         
         executor = self._get_executor()
-        status = executor.get_status()
-        
+        status = await executor.get_status_cached()
+
         await update.message.reply_text(
             f"🤖 *Agent Wallet Status*\n\n"
             f"Address: `{status['agent_address']}`\n\n"
@@ -309,14 +432,9 @@ _Your principal is always protected._"""
             return
         
         if context.args:
-            mode_map = {
-                'conservative': SpendingMode.CONSERVATIVE,
-                'balanced': SpendingMode.BALANCED,
-                'growth': SpendingMode.GROWTH
-            }
             mode_arg = context.args[0].lower()
-            if mode_arg in mode_map:
-                self.agent.state.spending_mode = mode_map[mode_arg]
+            if mode_arg in _MODE_MAP:
+                self.agent.state.spending_mode = _MODE_MAP[mode_arg]
                 await self.agent.save_state_snapshot()
                 new_mode = self.agent.state.spending_mode
                 await update.message.reply_text(
@@ -336,53 +454,31 @@ _Your principal is always protected._"""
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode=ParseMode.MARKDOWN)
     
-    async def callback_mode(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        query = update.callback_query
-        await query.answer()
-        
-        mode_map = {
-            'mode_conservative': SpendingMode.CONSERVATIVE,
-            'mode_balanced': SpendingMode.BALANCED,
-            'mode_growth': SpendingMode.GROWTH
-        }
-        
-        if query.data in mode_map:
-            self.agent.state.spending_mode = mode_map[query.data]
+    def _make_mode_cb(self, mode: SpendingMode):
+        """Build the callback for one exact mode payload.
+
+        One handler per payload with an anchored pattern means the
+        dispatcher resolves the button press without a dict lookup or
+        prefix regex scan in the handler body.
+        """
+        async def callback_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            query = update.callback_query
+            await query.answer()
+
+            self.agent.state.spending_mode = mode
             await self.agent.save_state_snapshot()
-            new_mode = self.agent.state.spending_mode
             await query.edit_message_text(
-                f"✅ Mode changed to *{new_mode.name.title()}* ({int(new_mode.value * 100)}%)\n\n"
+                f"✅ Mode changed to *{mode.name.title()}* ({int(mode.value * 100)}%)\n\n"
                 f"Available budget: ${self.agent.state.available_budget:,.2f}",
                 parse_mode=ParseMode.MARKDOWN)
+
+        return callback_mode
     
     async def cmd_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not await self._check_auth(update):
             return
         
-        help_text = """🛡️ *Yield Guardian Commands*
-
-*💰 Spending:*
-/spend <amount> - Check if amount is within budget
-/topup - See available yield for card
-/transfer <amount> - Send yield to Wirex card
-
-*📊 Status:*
-/status - Overview of balances & budget
-/budget - Detailed budget breakdown
-/yield - Yield accrual details
-/history - Recent transactions
-
-*⚙️ Settings:*
-/mode - Change spending mode
-/agent - Agent wallet status
-/help - This message
-
-*Spending Modes:*
-🐢 Conservative - Spend 50% of yield
-⚖️ Balanced - Spend 80% of yield
-🚀 Growth - Spend 30% of yield"""
-        
-        await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
+        await update.message.reply_text(_HELP, parse_mode=ParseMode.MARKDOWN)
     
     # ═══════════════════════════════════════════════════════════════
     # ALERTS
@@ -390,13 +486,48 @@ _Your principal is always protected._"""
     
     async def send_alert(self, message: str):
         if self.app and self.authorized_user_id:
+            await self._alert_queue.put(message)
+
+    async def _alert_flusher(self):
+        """Background task: drain queued alerts and send each burst as one
+        message.
+
+        A flood of on-chain events then costs one API call instead of one
+        per alert, staying clear of Telegram's per-bot send rate limit.
+        """
+        while True:
+            batch = [await self._alert_queue.get()]
             try:
-                await self.app.bot.send_message(
-                    chat_id=self.authorized_user_id,
-                    text=message,
-                    parse_mode=ParseMode.MARKDOWN)
-            except Exception as e:
-                logger.error(f"Failed to send alert: {e}")
+                while True:
+                    batch.append(self._alert_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                pass
+            await self._send_alert_batch(batch)
+
+    async def _send_alert_batch(self, batch: list):
+        """Send queued alerts, splitting the batch so no joined message
+        exceeds Telegram's 4096-character limit"""
+        chunk: list = []
+        length = 0
+        for msg in batch:
+            extra = len(msg) + (len(_ALERT_SEP) if chunk else 0)
+            if chunk and length + extra > _ALERT_MAX_LEN:
+                await self._send_alert_text(_ALERT_SEP.join(chunk))
+                chunk, length = [], 0
+                extra = len(msg)
+            chunk.append(msg)
+            length += extra
+        if chunk:
+            await self._send_alert_text(_ALERT_SEP.join(chunk))
+
+    async def _send_alert_text(self, text: str):
+        try:
+            await self.app.bot.send_message(
+                chat_id=self.authorized_user_id,
+                text=text,
+                parse_mode=ParseMode.MARKDOWN)
+        except Exception as e:
+            logger.error(f"Failed to send alert: {e}")
     
     async def send_transaction_alert(self, tx: Transaction, is_within_budget: bool, message: str):
         emoji = "✅" if is_within_budget else "🚨"
@@ -421,22 +552,66 @@ Budget: ${self.agent.state.available_budget:,.2f} remaining"""
         self.app.add_handler(CommandHandler("history", self.cmd_history))
         self.app.add_handler(CommandHandler("spend", self.cmd_spend))
         self.app.add_handler(CommandHandler("topup", self.cmd_topup))
-        self.app.add_handler(CommandHandler("transfer", self.cmd_transfer))
-        self.app.add_handler(CommandHandler("agent", self.cmd_agent))
+        # Slow handlers (RPC waits) must not hold up the update queue
+        self.app.add_handler(CommandHandler("transfer", self.cmd_transfer, block=False))
+        self.app.add_handler(CommandHandler("agent", self.cmd_agent, block=False))
         self.app.add_handler(CommandHandler("mode", self.cmd_mode))
         self.app.add_handler(CommandHandler("help", self.cmd_help))
-        self.app.add_handler(CallbackQueryHandler(self.callback_mode, pattern="^mode_"))
+        for name, mode in _MODE_MAP.items():
+            self.app.add_handler(CallbackQueryHandler(
+                self._make_mode_cb(mode), pattern=f"^mode_{name}$"))
     
     async def start(self):
-        self.app = Application.builder().token(self.token).build()
+        # concurrent_updates lets a slow handler (e.g. a pending transfer)
+        # run alongside quick ones instead of head-of-line blocking them.
+        # PTB's default HTTPX pool of 1 connection would re-serialize the
+        # concurrent replies, so give sends a real pool and keep a small
+        # separate one for getUpdates long-polls.
+        self.app = (
+            Application.builder()
+            .token(self.token)
+            .concurrent_updates(True)
+            .request(HTTPXRequest(
+                connection_pool_size=32,
+                pool_timeout=5.0,
+                read_timeout=30,
+                connect_timeout=10))
+            .get_updates_request(HTTPXRequest(connection_pool_size=4))
+            .build()
+        )
         self.setup_handlers()
         await self.app.initialize()
         await self.app.start()
-        await self.app.updater.start_polling(drop_pending_updates=True)
+        # Only the update types we handle, fetched via full 30s long-polls
+        # with no artificial pause between them
+        await self.app.updater.start_polling(
+            drop_pending_updates=True,
+            allowed_updates=["message", "callback_query"],
+            timeout=30,
+            poll_interval=0.0)
+        self._alert_flusher_task = asyncio.create_task(self._alert_flusher())
         logger.info("Telegram bot started")
         await self.send_alert("🛡️ *Yield Guardian Started!*\n\nMonitoring your wallet.\nSend /status to check.")
     
     async def stop(self):
+        if self._alert_flusher_task:
+            self._alert_flusher_task.cancel()
+            self._alert_flusher_task = None
+            # Flush whatever is still queued so shutdown doesn't drop it
+            leftover = []
+            try:
+                while True:
+                    leftover.append(self._alert_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                pass
+            if leftover and self.app:
+                await self._send_alert_batch(leftover)
+        if self._executor:
+            await self._executor.close()
+            self._executor = None
+        if self._db:
+            await self._db.close()
+            self._db = None
         if self.app:
             await self.app.updater.stop()
             await self.app.stop()
@@ -6,8 +6,12 @@ Uses the agent's limited wallet (funded via Safe spending limits)
 import os
 import asyncio
 import logging
+import time
 from decimal import Decimal
-from web3 import Web3
+from typing import Optional
+
+import aiohttp
+from web3 import AsyncWeb3, Web3
 from eth_account import Account
 
 logger = logging.getLogger('yield_guardian.executor')
@@ -49,7 +53,9 @@ class TransferExecutor:
     
     def __init__(self, config: dict):
         self.config = config
-        self.w3 = Web3(Web3.HTTPProvider(BASE_RPC))
+        # Async provider: RPC waits yield to the event loop instead of
+        # blocking the whole bot (handlers, alerts) for their duration
+        self.w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(BASE_RPC))
         
         # Load agent wallet - prefer environment variable for security
         private_key = os.environ.get('AGENT_PRIVATE_KEY') or config.get('agent_private_key', '')
@@ -61,97 +67,241 @@ class TransferExecutor:
         
         # Destination
         self.wirex_pay_address = config.get('wirex_pay_address', '')
-        
+
         # USDC contract
         self.usdc_contract = self.w3.eth.contract(
             address=Web3.to_checksum_address(USDC_ADDRESS),
             abi=ERC20_ABI
         )
+
+        # Checksumming runs keccak over the hex string; both addresses are
+        # fixed for the executor's lifetime, so do it once here
+        self._agent_addr = self.agent_account.address
+        self._wirex_addr = (
+            Web3.to_checksum_address(self.wirex_pay_address)
+            if self.wirex_pay_address else None
+        )
+        self._balance_of_fn = self.usdc_contract.functions.balanceOf
+
+        # transfer(address,uint256) calldata: the selector and the padded
+        # destination never change, so ABI-encode them once; per-tx only
+        # the 32-byte amount tail is appended
+        if self._wirex_addr:
+            self._transfer_prefix = (
+                bytes.fromhex("a9059cbb")
+                + bytes.fromhex(self._wirex_addr[2:]).rjust(32, b'\x00')
+            )
+        else:
+            self._transfer_prefix = None
+
+        # Short-TTL status cache: (monotonic timestamp, status dict)
+        self._status_cache: Optional[tuple] = None
+
+        # Locally tracked nonce: seeded from the node once, then advanced
+        # in-process so each send skips the eth_getTransactionCount RPC.
+        # The lock serializes concurrent submissions over it.
+        self._next_nonce: Optional[int] = None
+        self._nonce_lock = asyncio.Lock()
+
+        # Keep-alive session shared by every RPC (see _ensure_session)
+        self._rpc_session: Optional[aiohttp.ClientSession] = None
     
-    def get_agent_usdc_balance(self) -> Decimal:
+    async def _ensure_session(self):
+        """Attach one pooled keep-alive aiohttp session to the provider.
+
+        Without it every eth_* call can pay a fresh TCP+TLS handshake
+        (two round-trips) against the RPC host; with it only the first
+        call does.
+        """
+        if self._rpc_session is None or self._rpc_session.closed:
+            self._rpc_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=8, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+            await self.w3.provider.cache_async_session(self._rpc_session)
+
+    async def close(self):
+        """Release the RPC session"""
+        if self._rpc_session is not None and not self._rpc_session.closed:
+            await self._rpc_session.close()
+        self._rpc_session = None
+
+    async def get_agent_usdc_balance(self) -> Decimal:
         """Check USDC balance of agent wallet"""
-        balance = self.usdc_contract.functions.balanceOf(
-            self.agent_account.address
-        ).call()
+        await self._ensure_session()
+        balance = await self._balance_of_fn(self._agent_addr).call()
         return Decimal(balance) / Decimal(10 ** USDC_DECIMALS)
-    
-    def get_agent_eth_balance(self) -> Decimal:
+
+    async def get_agent_eth_balance(self) -> Decimal:
         """Check ETH balance for gas"""
-        balance = self.w3.eth.get_balance(self.agent_account.address)
+        await self._ensure_session()
+        balance = await self.w3.eth.get_balance(self._agent_addr)
         return Decimal(balance) / Decimal(10 ** 18)
     
-    async def transfer_to_wirex(self, amount_usd: float) -> dict:
+    async def submit_transfer(self, amount_usd: float, prechecked: bool = False) -> dict:
         """
-        Transfer USDC from agent wallet to Wirex Pay.
-        
+        Build, sign and broadcast a USDC transfer to Wirex Pay, returning
+        as soon as the tx hash is known (~1 RPC round-trip) rather than
+        waiting out confirmation. Pair with await_receipt.
+
+        When the caller has just verified balances (e.g. via
+        get_status_cached), pass prechecked=True to skip re-fetching them.
+
         Returns:
-            dict with 'success', 'tx_hash', 'amount', 'explorer_url' or 'error'
+            dict with 'success', 'tx_hash', 'amount' or 'error'
         """
-        
-        # Check balances
-        usdc_balance = self.get_agent_usdc_balance()
-        eth_balance = self.get_agent_eth_balance()
-        
-        if usdc_balance < Decimal(str(amount_usd)):
-            return {
-                "success": False,
-                "error": f"Insufficient USDC. Have ${usdc_balance:.2f}, need ${amount_usd:.2f}"
-            }
-        
-        if eth_balance < Decimal("0.0001"):
-            return {
-                "success": False,
-                "error": f"Insufficient ETH for gas. Have {eth_balance:.6f} ETH"
-            }
-        
-        try:
-            # Build transaction
-            amount_raw = int(Decimal(str(amount_usd)) * Decimal(10 ** USDC_DECIMALS))
-            
-            tx = self.usdc_contract.functions.transfer(
-                Web3.to_checksum_address(self.wirex_pay_address),
-                amount_raw
-            ).build_transaction({
-                'from': self.agent_account.address,
-                'nonce': self.w3.eth.get_transaction_count(self.agent_account.address),
-                'gas': 100000,
-                'gasPrice': self.w3.eth.gas_price,
-                'chainId': 8453  # Base
-            })
-            
-            # Sign and send
-            signed_tx = self.w3.eth.account.sign_transaction(tx, self.agent_account.key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            
-            # Wait for confirmation
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-            
-            if receipt['status'] == 1:
-                logger.info(f"Transfer successful: ${amount_usd} USDC to Wirex Pay")
+
+        await self._ensure_session()
+        agent = self._agent_addr
+
+        if prechecked:
+            latest_block = await self.w3.eth.get_block('latest')
+        else:
+            # One JSON-RPC batch round-trip instead of sequential calls:
+            # USDC balance, ETH balance, and the latest block (for fees)
+            async with self.w3.batch_requests() as batch:
+                batch.add(self._balance_of_fn(agent))
+                batch.add(self.w3.eth.get_balance(agent))
+                batch.add(self.w3.eth.get_block('latest'))
+                usdc_raw, eth_raw, latest_block = await batch.async_execute()
+
+            usdc_balance = Decimal(usdc_raw) / Decimal(10 ** USDC_DECIMALS)
+            eth_balance = Decimal(eth_raw) / Decimal(10 ** 18)
+
+            if usdc_balance < Decimal(str(amount_usd)):
                 return {
-                    "success": True,
-                    "tx_hash": tx_hash.hex(),
-                    "amount": amount_usd,
-                    "explorer_url": f"https://basescan.org/tx/{tx_hash.hex()}"
+                    "success": False,
+                    "error": f"Insufficient USDC. Have ${usdc_balance:.2f}, need ${amount_usd:.2f}"
                 }
-            else:
+
+            if eth_balance < Decimal("0.0001"):
                 return {
                     "success": False,
-                    "error": "Transaction failed on-chain"
+                    "error": f"Insufficient ETH for gas. Have {eth_balance:.6f} ETH"
+                }
+        
+        try:
+            # Build transaction
+            amount_raw = int(Decimal(str(amount_usd)) * Decimal(10 ** USDC_DECIMALS))
+
+            # EIP-1559 fees: only baseFee + tip is actually charged, so the
+            # 2x cap is headroom for base-fee spikes, not extra cost.
+            # Base tips are minuscule.
+            tip = self.w3.to_wei(0.001, 'gwei')
+            max_fee = latest_block['baseFeePerGas'] * 2 + tip
+
+            async with self._nonce_lock:
+                if self._next_nonce is None:
+                    # 'pending' so txs already in the mempool are counted
+                    self._next_nonce = await self.w3.eth.get_transaction_count(
+                        agent, 'pending')
+                nonce = self._next_nonce
+
+                data = self._transfer_prefix + amount_raw.to_bytes(32, 'big')
+                tx = {
+                    'to': self.usdc_contract.address,
+                    'data': '0x' + data.hex(),
+                    'from': agent,
+                    'value': 0,
+                    'nonce': nonce,
+                    'gas': 70000,  # USDC transfers use ~65k
+                    'maxFeePerGas': max_fee,
+                    'maxPriorityFeePerGas': tip,
+                    'chainId': 8453  # Base
                 }
-                
+
+                # Sign and send (signing is pure local crypto, stays sync)
+                signed_tx = Account.sign_transaction(tx, self.agent_account.key)
+                try:
+                    tx_hash = await self.w3.eth.send_raw_transaction(
+                        signed_tx.raw_transaction)
+                except Exception:
+                    # Unknown whether the node saw the tx; resync from the
+                    # node on the next submission
+                    self._next_nonce = None
+                    raise
+                self._next_nonce = nonce + 1
+
+            # to_0x_hex: under hexbytes>=1.0 (web3 v7) plain .hex() drops
+            # the 0x prefix, which nodes and explorer links both require
+            tx_hash_hex = tx_hash.to_0x_hex()
+            logger.info(f"Transfer submitted: ${amount_usd} USDC, tx {tx_hash_hex}")
+            return {
+                "success": True,
+                "tx_hash": tx_hash_hex,
+                "amount": amount_usd
+            }
+
         except Exception as e:
             logger.error(f"Transfer failed: {e}")
             return {
                 "success": False,
                 "error": str(e)
             }
+
+    async def await_receipt(self, tx_hash: str) -> dict:
+        """Wait for a submitted transfer to confirm on-chain.
+
+        Returns:
+            dict with 'success', 'tx_hash', 'explorer_url' or 'error'
+        """
+        await self._ensure_session()
+        try:
+            receipt = await self.w3.eth.wait_for_transaction_receipt(
+                tx_hash, timeout=120, poll_latency=2
+            )
+        except Exception as e:
+            logger.error(f"Receipt wait failed for {tx_hash}: {e}")
+            return {"success": False, "error": str(e)}
+
+        if receipt['status'] == 1:
+            return {
+                "success": True,
+                "tx_hash": tx_hash,
+                "explorer_url": f"https://basescan.org/tx/{tx_hash}"
+            }
+        return {
+            "success": False,
+            "error": "Transaction failed on-chain"
+        }
+
+    async def transfer_to_wirex(self, amount_usd: float, prechecked: bool = False) -> dict:
+        """submit_transfer + await_receipt in one call, for callers that
+        want the old blocking semantics.
+
+        Returns:
+            dict with 'success', 'tx_hash', 'amount', 'explorer_url' or 'error'
+        """
+        submitted = await self.submit_transfer(amount_usd, prechecked=prechecked)
+        if not submitted['success']:
+            return submitted
+
+        result = await self.await_receipt(submitted['tx_hash'])
+        result['amount'] = amount_usd
+        if result['success']:
+            logger.info(f"Transfer successful: ${amount_usd} USDC to Wirex Pay")
+        return result
     
-    def get_status(self) -> dict:
+    async def get_status(self) -> dict:
         """Get current status of agent wallet"""
+        usdc_balance, eth_balance = await asyncio.gather(
+            self.get_agent_usdc_balance(),
+            self.get_agent_eth_balance()
+        )
         return {
-            "agent_address": self.agent_account.address,
-            "usdc_balance": float(self.get_agent_usdc_balance()),
-            "eth_balance": float(self.get_agent_eth_balance()),
+            "agent_address": self._agent_addr,
+            "usdc_balance": float(usdc_balance),
+            "eth_balance": float(eth_balance),
             "wirex_destination": self.wirex_pay_address
         }
+
+    async def get_status_cached(self, ttl: float = 3.0) -> dict:
+        """get_status with a short TTL so back-to-back commands (e.g.
+        /transfer's precheck followed by the transfer itself) don't repeat
+        the same balance RPCs."""
+        now = time.monotonic()
+        if self._status_cache is not None and now - self._status_cache[0] < ttl:
+            return self._status_cache[1]
+        status = await self.get_status()
+        self._status_cache = (time.monotonic(), status)
+        return status